@@ -7,9 +7,18 @@ OUTPUT_DIR = Path("./out_resume_json") # Where to write per-file JSONs and the m
 
 # Extraction provider/model
 PROVIDER = "ollama"          # or "openai"
-MODEL = "llama3.2"           # (OpenAI example: "gpt-4o-mini")
+MODEL = "llama3.2:3b-instruct-q4_K_M"  # 4-bit quantized; pull first: `ollama pull llama3.2:3b-instruct-q4_K_M`
+                                      # (OpenAI example: "gpt-4o-mini")
 OLLAMA_HOST = "http://localhost:11434"
 
+# Concurrency / Ollama tuning
+MAX_WORKERS = 8              # parallel LLM requests; for Ollama match the server's OLLAMA_NUM_PARALLEL
+OLLAMA_NUM_CTX = None        # context window for every request (None = OLLAMA_MAX_CTX)
+OLLAMA_MAX_CTX = 8192        # default context window; longer resumes are truncated with a warning
+OLLAMA_NUM_BATCH = None      # prompt batch size override (None = model default)
+OLLAMA_NUM_PREDICT = 2048    # max tokens generated per resume
+OLLAMA_KEEP_ALIVE = "10m"    # keep the model loaded between requests
+
 # OpenAI API key: prefer environment variable in practice (avoid committing secrets)
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")  # leave blank or set via env
 # Auto-merge after extraction
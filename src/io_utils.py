@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shared I/O helpers for resume_extractor.py and merge_jsons.py.
+- JSON read/write through orjson when installed, stdlib json otherwise
+- Single-pass os.scandir walker for resume files
+"""
+
+from __future__ import annotations
+import os
+import json
+from pathlib import Path
+from typing import Any, Iterator, Tuple, Union
+
+try:
+    import orjson  # optional, faster JSON parse/serialize
+except ImportError:
+    orjson = None
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def read_json(path: Path) -> Any:
+    return json_loads(Path(path).read_bytes())
+
+def write_json(path: Path, obj: Any) -> None:
+    if orjson is not None:
+        Path(path).write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with Path(path).open("w", encoding="utf-8") as fh:
+        json.dump(obj, fh, ensure_ascii=False, indent=2)
+
+RESUME_SUFFIXES = (".pdf", ".docx", ".json")
+
+def iter_resume_files(root: Path, suffixes: Tuple[str, ...] = RESUME_SUFFIXES) -> Iterator[os.DirEntry]:
+    # One scandir per directory; is_dir()/is_file() reuse the cached d_type, so
+    # files cost no extra stat. Suffix match is case-insensitive; dir symlinks are not followed.
+    # Hidden directories (.git, the .extract_cache under OUTPUT_DIR) are skipped.
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            stack.append(entry.path)
+                    elif entry.name.lower().endswith(suffixes) and entry.is_file():
+                        yield entry
+                except OSError:
+                    continue
@@ -12,13 +12,22 @@ Merge per-file resume JSONs into one master resume.
 
 from __future__ import annotations
 import os
-import json
 import re
+import functools
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
-from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
 import difflib
 
+try:
+    # Optional C-accelerated fuzzy matching; difflib is used when missing
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = process = None
+
+from io_utils import iter_resume_files, read_json, write_json
+
 try:
     # For repo-local config
     from config import INPUT_DIR, OUTPUT_DIR
@@ -30,6 +39,13 @@ except Exception:
 OUTPUT_MASTER = OUTPUT_DIR / "master_resume.json"
 EXCLUDE_PATTERNS = [r"^master.*\.json$", r"^merged.*\.json$"]
 
+_WS_RE = re.compile(r"\s+")
+_YEAR_RE = re.compile(r"(19|20)\d{2}")
+# YYYY, YYYY-MM or YYYY-MM-DD with one consistent separator out of - / .
+_DATE_RE = re.compile(r"^(\d{4})(?:([-/.])(\d{1,2})(?:\2(\d{1,2}))?)?$")
+# Group each pattern so alternations inside one can't leak into its neighbours
+_EXCLUDE_RE = re.compile("|".join(f"(?:{p})" for p in EXCLUDE_PATTERNS), re.IGNORECASE)
+
 JSON_SCHEMA_EXAMPLE = {
   "basics": {"name": "", "label": "", "image": "", "email": "", "phone": "", "url": "", "summary": "",
     "location": {"address": "", "postalCode": "", "city": "", "countryCode": "", "region": ""},
@@ -47,32 +63,62 @@ JSON_SCHEMA_EXAMPLE = {
   "projects": [{"name": "", "startDate": "", "endDate": "", "description": "", "highlights": [], "url": ""}]
 }
 
+@functools.lru_cache(maxsize=100_000)
 def normalize_str(x: str) -> str:
-    return re.sub(r"\s+", " ", (x or "").strip().lower())
+    return _WS_RE.sub(" ", (x or "").strip().lower())
 
-def to_text(x: Any) -> str:
+_SCALARS = (str, int, float, bool)
+_TEXT_KEYS = ("text", "bullet", "content", "value", "description", "summary", "highlight")
+_NO_LABEL = object()  # marks list items, which are joined without a "key: " prefix
+
+def _leaf_text(x: Any):
+    # Text for anything that needs no descent; None for lists/dicts that must be walked
     if x is None:
         return ""
-    if isinstance(x, str):
-        return x
-    if isinstance(x, (int, float, bool)):
+    if isinstance(x, _SCALARS):
         return str(x)
-    if isinstance(x, list):
-        return ", ".join([to_text(i) for i in x if to_text(i)])
     if isinstance(x, dict):
-        if "text" in x and isinstance(x["text"], (str, int, float, bool)):
-            return str(x["text"])
-        for key_guess in ("bullet", "content", "value", "description", "summary", "highlight"):
-            if key_guess in x and isinstance(x[key_guess], (str, int, float, bool)):
+        for key_guess in _TEXT_KEYS:
+            if key_guess in x and isinstance(x[key_guess], _SCALARS):
                 return str(x[key_guess])
-        pairs = []
-        for k, v in x.items():
-            vs = to_text(v)
-            if vs:
-                pairs.append(f"{k}: {vs}")
-        return "; ".join(pairs)
+        return None
+    if isinstance(x, list):
+        return None
     return str(x)
 
+def _children(x: Any):
+    # (label, value) pairs and the separator joining their non-empty texts
+    if isinstance(x, list):
+        return ((_NO_LABEL, v) for v in x), ", "
+    return iter(x.items()), "; "
+
+def to_text(x: Any) -> str:
+    if isinstance(x, str):
+        return x
+    leaf = _leaf_text(x)
+    if leaf is not None:
+        return leaf
+    # Iterative walk: each frame is (children, collected parts, separator, label in parent)
+    items, sep = _children(x)
+    stack = [(items, [], sep, _NO_LABEL)]
+    while True:
+        items, parts, sep, _ = stack[-1]
+        for label, v in items:
+            leaf = _leaf_text(v)
+            if leaf is None:
+                child_items, child_sep = _children(v)
+                stack.append((child_items, [], child_sep, label))
+                break
+            if leaf:
+                parts.append(leaf if label is _NO_LABEL else f"{label}: {leaf}")
+        else:
+            _, parts, sep, label = stack.pop()
+            text = sep.join(parts)
+            if not stack:
+                return text
+            if text:
+                stack[-1][1].append(text if label is _NO_LABEL else f"{label}: {text}")
+
 def coerce_list_of_strings(val: Any) -> List[str]:
     if val is None:
         return []
@@ -92,46 +138,92 @@ def coerce_list_of_strings(val: Any) -> List[str]:
     return []
 
 def similar(a: str, b: str) -> float:
-    return difflib.SequenceMatcher(a=normalize_str(a), b=normalize_str(b)).ratio()
+    na, nb = normalize_str(a), normalize_str(b)
+    if fuzz is not None:
+        return fuzz.ratio(na, nb) / 100.0
+    # difflib fallback when rapidfuzz is not installed.
+    # autojunk treats chars in >1% of a 200+ char string as junk, so near-identical
+    # repetitive text (boilerplate bullets, legal prose) can score ~0.2 instead of ~0.99
+    return difflib.SequenceMatcher(None, na, nb, autojunk=False).ratio()
+
+def _difflib_has_match(matcher: difflib.SequenceMatcher, norm: str, prev_norms: List[str], threshold: float) -> bool:
+    n = len(norm)
+    # seq2 is where SequenceMatcher caches its index, so set it once per candidate
+    matcher.set_seq2(norm)
+    for prev_norm in prev_norms:
+        pn = len(prev_norm)
+        # ratio() <= 2*min/(n+pn); reject on lengths alone before touching the matcher
+        if 2.0 * min(n, pn) < threshold * (n + pn):
+            continue
+        matcher.set_seq1(prev_norm)
+        # quick_ratio() is an O(L) multiset upper bound on ratio()
+        if matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold:
+            return True
+    return False
 
 def dedupe_list_str(items: List[Any], threshold: float = 0.92) -> List[str]:
     out: List[str] = []
+    out_norms: List[str] = []  # normalized form of each kept item, parallel to out
+    matcher = difflib.SequenceMatcher(autojunk=False) if process is None else None
     for it in items:
         s = to_text(it).strip()
         if not s:
             continue
-        if any(similar(s, prev) >= threshold for prev in out):
-            continue
+        norm = normalize_str(s)
+        if out_norms:
+            if process is not None:
+                # one C call scores norm against every kept item
+                dup = process.extractOne(norm, out_norms, scorer=fuzz.ratio, score_cutoff=threshold * 100) is not None
+            else:
+                dup = _difflib_has_match(matcher, norm, out_norms, threshold)
+            if dup:
+                continue
         out.append(s)
+        out_norms.append(norm)
     return out
 
-def parse_date_iso(s: str) -> str:
-    s = (s or "").strip()
+def parse_date_iso(s: Any) -> str:
+    # LLM output can put lists/dicts/numbers in date fields; coerce before the cached, hashable-only parse
+    return _parse_date_text(to_text(s))
+
+@functools.lru_cache(maxsize=10_000)
+def _parse_date_text(s: str) -> str:
+    s = s.strip()
     if not s:
         return ""
-    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y-%m", "%Y/%m", "%Y.%m", "%Y"):
+    m = _DATE_RE.match(s)
+    if m:
+        y, _, mo, d = m.groups()
         try:
-            dt = datetime.strptime(s, fmt)
-            if fmt == "%Y":
-                return f"{dt.year:04d}-01-01"
-            if fmt in ("%Y-%m", "%Y/%m", "%Y.%m"):
-                return f"{dt.year:04d}-{dt.month:02d}-01"
-            return dt.strftime("%Y-%m-%d")
-        except Exception:
+            dt = date(int(y), int(mo or 1), int(d or 1))
+        except ValueError:
             pass
-    m = re.search(r"(19|20)\d{2}", s)
+        else:
+            return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d}"
+    m = _YEAR_RE.search(s)
     if m:
         return f"{m.group(0)}-01-01"
     return s
 
+@functools.lru_cache(maxsize=10_000)
+def iso_to_date(s: str) -> Optional[date]:
+    # date for a normalized YYYY-MM-DD string, None if empty or unparseable
+    try:
+        return date.fromisoformat(s) if s else None
+    except (TypeError, ValueError):
+        return None
+
+_UNKNOWN_ORDINAL = date(1900, 1, 1).toordinal()
+
+def parse_iso(s: str) -> int:
+    # Integer sort key (proleptic ordinal) for a normalized date; unknown dates sort last
+    d = iso_to_date(s)
+    return d.toordinal() if d else _UNKNOWN_ORDINAL
+
 from typing import Tuple
 def merge_date_range(a_start: str, a_end: str, b_start: str, b_end: str) -> Tuple[str, str]:
     def to_dt(s):
-        s = parse_date_iso(s)
-        try:
-            return datetime.strptime(s, "%Y-%m-%d").date() if s else None
-        except Exception:
-            return None
+        return iso_to_date(parse_date_iso(s))
     asd, aed, bsd, bed = map(to_dt, [a_start, a_end, b_start, b_end])
     starts = [d for d in (asd, bsd) if d]
     start = min(starts) if starts else None
@@ -139,6 +231,24 @@ def merge_date_range(a_start: str, a_end: str, b_start: str, b_end: str) -> Tupl
     end = max(ends) if ends else None
     return (start.isoformat() if start else ""), (end.isoformat() if end else "")
 
+def cluster_names(names: List[str], cutoff: float = 90) -> Dict[str, str]:
+    # Map each distinct non-empty name to the first-seen representative it matches with
+    # token_sort_ratio >= cutoff. Names are compared to representatives only, never chained
+    # through other members, and a token subset is not a match ("ibm consulting" and
+    # "accenture consulting" must not meet via "consulting"). Without rapidfuzz, names map to themselves.
+    canon: Dict[str, str] = {}
+    reps: List[str] = []
+    for n in dict.fromkeys(n for n in names if n):
+        hit = None
+        if process is not None and reps:
+            hit = process.extractOne(n, reps, scorer=fuzz.token_sort_ratio, score_cutoff=cutoff)
+        if hit is None:
+            reps.append(n)
+            canon[n] = n
+        else:
+            canon[n] = hit[0]
+    return canon
+
 def merge_work_entries(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
     start, end = merge_date_range(a.get("startDate",""), a.get("endDate",""), b.get("startDate",""), b.get("endDate",""))
     highlights = dedupe_list_str(coerce_list_of_strings(a.get("highlights")) + coerce_list_of_strings(b.get("highlights")))
@@ -155,52 +265,55 @@ def merge_work_entries(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 def merge_sections_list_of_objs(section_lists: List[List[Dict[str, Any]]], key_fields: List[str]) -> List[Dict[str, Any]]:
-    bucket: Dict[str, Dict[str, Any]] = {}
+    list_fields = ("highlights", "courses", "keywords")
+    date_fields = ("date", "startDate", "endDate", "releaseDate")
     def makekey(o: Dict[str, Any]) -> str:
         parts = [normalize_str(to_text(o.get(k,""))) for k in key_fields]
         return " | ".join(parts)
+    # Pass 1: group shallow copies by key so caller dicts are never mutated
+    groups: Dict[str, List[Dict[str, Any]]] = {}
     for section in section_lists:
         for obj in section or []:
-            for fld in ("highlights", "courses", "keywords"):
-                if fld in obj:
-                    obj[fld] = dedupe_list_str(coerce_list_of_strings(obj.get(fld)))
-            for d in ("date","startDate","endDate","releaseDate"):
+            obj = dict(obj)
+            for d in date_fields:
                 if d in obj:
                     obj[d] = parse_date_iso(obj.get(d,""))
             k = makekey(obj)
             if not k.strip(" |"):
                 continue
-            if k not in bucket:
-                bucket[k] = obj
-            else:
-                existing = bucket[k]
-                for fld in ("highlights", "courses", "keywords"):
-                    if fld in obj:
-                        existing[fld] = dedupe_list_str(coerce_list_of_strings(existing.get(fld)) + coerce_list_of_strings(obj.get(fld)))
-                for fld, val in obj.items():
-                    if isinstance(val, str) and val and not to_text(existing.get(fld,"")).strip():
-                        existing[fld] = val
-    return list(bucket.values())
+            groups.setdefault(k, []).append(obj)
+    # Pass 2: dedupe each list field once per group over all members
+    merged: List[Dict[str, Any]] = []
+    for objs in groups.values():
+        entry = objs[0]
+        for fld in list_fields:
+            if any(fld in o for o in objs):
+                entry[fld] = dedupe_list_str([s for o in objs for s in coerce_list_of_strings(o.get(fld))])
+        for o in objs[1:]:
+            for fld, val in o.items():
+                if isinstance(val, str) and val and not to_text(entry.get(fld,"")).strip():
+                    entry[fld] = val
+        merged.append(entry)
+    return merged
+
+LEVEL_RANK = {"":0, "beginner":1, "intermediate":2, "advanced":3, "expert":4, "master":5}
+LEVEL_NAME = {v: k for k, v in LEVEL_RANK.items()}
 
 def merge_skills_lists(skills_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    # Accumulate raw keywords and the best level rank per skill, then dedupe once per skill
     merged: Dict[str, Dict[str, Any]] = {}
-    level_rank = {"":0, "beginner":1, "intermediate":2, "advanced":3, "expert":4, "master":5}
     for skills in skills_lists:
         for s in skills or []:
             name = to_text(s.get("name","")).strip()
             if not name:
                 continue
-            key = normalize_str(name)
-            entry = merged.get(key, {"name": name, "level": "", "keywords": []})
-            new_level = to_text(s.get("level","")).strip().lower()
-            cur_level = entry.get("level","").lower()
-            if level_rank.get(new_level,0) > level_rank.get(cur_level,0):
-                entry["level"] = new_level
-            kws = dedupe_list_str(coerce_list_of_strings(s.get("keywords")))
-            entry["keywords"] = dedupe_list_str(entry.get("keywords", []) + kws)
-            entry["name"] = name or entry["name"]
-            merged[key] = entry
-    return sorted(merged.values(), key=lambda x: normalize_str(x["name"]))
+            entry = merged.setdefault(normalize_str(name), {"name": name, "rank": 0, "kws_raw": []})
+            entry["rank"] = max(entry["rank"], LEVEL_RANK.get(to_text(s.get("level","")).strip().lower(), 0))
+            entry["kws_raw"].extend(coerce_list_of_strings(s.get("keywords")))
+            entry["name"] = name
+    out = [{"name": e["name"], "level": LEVEL_NAME[e["rank"]], "keywords": dedupe_list_str(e["kws_raw"])}
+           for e in merged.values()]
+    return sorted(out, key=lambda x: normalize_str(x["name"]))
 
 def merge_all_resumes(resumes: List[Dict[str, Any]]) -> Dict[str, Any]:
     def basics_score(b):
@@ -215,15 +328,18 @@ def merge_all_resumes(resumes: List[Dict[str, Any]]) -> Dict[str, Any]:
     if chosen_basics:
         chosen_basics["profiles"] = profiles_merged
 
-    all_work = [w for r in resumes for w in (r.get("work") or [])]
+    all_work = [dict(w) for r in resumes for w in (r.get("work") or [])]
     for w in all_work:
         w["startDate"] = parse_date_iso(w.get("startDate",""))
         w["endDate"] = parse_date_iso(w.get("endDate",""))
         w["highlights"] = dedupe_list_str(coerce_list_of_strings(w.get("highlights")))
         w["summary"] = to_text(w.get("summary",""))
     keymap: Dict[str, Dict[str, Any]] = {}
+    # Near-identical spellings ("acme corp." / "acme corp") should land in the same bucket
+    canon = cluster_names([normalize_str(to_text(w.get("name",""))) for w in all_work])
     def wkey(w):
         c = normalize_str(to_text(w.get("name","")))
+        c = canon.get(c, c)
         p = normalize_str(to_text(w.get("position","")))
         return f"{c}||{p}"
     for w in all_work:
@@ -236,12 +352,7 @@ def merge_all_resumes(resumes: List[Dict[str, Any]]) -> Dict[str, Any]:
             keymap[k] = merge_work_entries(keymap[k], w)
 
     merged_work = list(keymap.values())
-
-    def parse_iso(s: str) -> datetime:
-        try:
-            return datetime.strptime(s, "%Y-%m-%d")
-        except Exception:
-            return datetime(1900,1,1)
+    # key= runs once per entry, so each date is parsed once (and cached across runs of the same string)
     merged_work.sort(key=lambda w: (parse_iso(w.get("startDate","")), parse_iso(w.get("endDate",""))), reverse=True)
 
     merged_volunteer    = merge_sections_list_of_objs([r.get("volunteer") or [] for r in resumes], ["organization","position","startDate","endDate"])
@@ -273,26 +384,27 @@ def merge_all_resumes(resumes: List[Dict[str, Any]]) -> Dict[str, Any]:
     return master
 
 def should_exclude(name: str) -> bool:
-    for pat in EXCLUDE_PATTERNS:
-        if re.search(pat, name, flags=re.IGNORECASE):
-            return True
-    return False
+    return bool(_EXCLUDE_RE.match(name))
+
+def _load_one(p: Path) -> Tuple[Path, Any]:
+    try:
+        data = read_json(p)
+    except Exception as e:
+        print(f"[!] Failed to load {p}: {e}")
+        return p, None
+    if not isinstance(data, dict):
+        print(f"[!] Skipping non-dict JSON: {p}")
+        return p, None
+    return p, data
 
 def load_all_jsons(root: Path) -> List[Dict[str, Any]]:
-    resumes: List[Dict[str, Any]] = []
-    for p in root.rglob("*.json"):
-        if should_exclude(p.name):
-            continue
-        try:
-            with p.open("r", encoding="utf-8") as fh:
-                data = json.load(fh)
-            if isinstance(data, dict):
-                resumes.append(data)
-            else:
-                print(f"[!] Skipping non-dict JSON: {p}")
-        except Exception as e:
-            print(f"[!] Failed to load {p}: {e}")
-    return resumes
+    paths = [Path(e.path) for e in iter_resume_files(root, (".json",)) if not should_exclude(e.name)]
+    if not paths:
+        return []
+    # Loading is I/O-bound, so threads overlap the reads; map() keeps file order
+    with ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 2)) as ex:
+        results = list(ex.map(_load_one, paths))
+    return [data for _, data in results if data is not None]
 
 def main():
     in_dir = Path(INPUT_DIR).expanduser().resolve()
@@ -306,8 +418,7 @@ def main():
         return
 
     master = merge_all_resumes(resumes)
-    with out_path.open("w", encoding="utf-8") as fh:
-        json.dump(master, fh, ensure_ascii=False, indent=2)
+    write_json(out_path, master)
     print(f"[✓] Master resume written to: {out_path}")
 
 if __name__ == "__main__":
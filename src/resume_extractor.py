@@ -7,16 +7,16 @@ Optionally merges all JSONs into a master resume via merge_jsons.py.
 """
 
 from __future__ import annotations
-import os, json, re, requests, sys
+import os, io, json, re, requests, sys, hashlib
+from requests.adapters import HTTPAdapter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
+from io_utils import iter_resume_files, json_loads, read_json, write_json
 from config import INPUT_DIR, OUTPUT_DIR, PROVIDER, MODEL, OLLAMA_HOST, OPENAI_API_KEY, MERGE_AFTER_EXTRACTION
-
-# Text extraction backends
-import fitz  # PyMuPDF (default)
-from docx import Document
+from config import MAX_WORKERS, OLLAMA_NUM_CTX, OLLAMA_NUM_BATCH, OLLAMA_NUM_PREDICT, OLLAMA_KEEP_ALIVE, OLLAMA_MAX_CTX
 
 # -----------------------------
 # JSON schema example
@@ -38,6 +38,24 @@ JSON_SCHEMA_EXAMPLE = {
   "projects": [{"name": "", "startDate": "", "endDate": "", "description": "", "highlights": [], "url": ""}]
 }
 
+SCHEMA_PROMPT = json.dumps(JSON_SCHEMA_EXAMPLE, indent=2)
+
+def schema_from_example(example: Any) -> Dict[str, Any]:
+    # Strict JSON Schema mirroring the example: every key required, no extra keys, leaves are strings
+    if isinstance(example, dict):
+        return {
+            "type": "object",
+            "properties": {k: schema_from_example(v) for k, v in example.items()},
+            "required": list(example),
+            "additionalProperties": False
+        }
+    if isinstance(example, list):
+        return {"type": "array", "items": schema_from_example(example[0]) if example else {"type": "string"}}
+    return {"type": "string"}
+
+# Passed to the LLM for constrained decoding, so responses always parse
+RESUME_SCHEMA = schema_from_example(JSON_SCHEMA_EXAMPLE)
+
 EXTRACTION_SYSTEM_PROMPT = """You are a careful information extraction assistant.
 You will be given the full text of a resume. Your job is to convert it into a STRICT JSON object following the provided JSON schema exactly (keys, nesting, and arrays).
 - Use ISO dates (YYYY-MM-DD) where possible; if only year/month known, use YYYY-MM-01.
@@ -60,10 +78,13 @@ Resume text:
 # File discovery & reading
 # -----------------------------
 
+_HSPACE_RE = re.compile(r"[ \t]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
 def find_resume_files(root: Path) -> List[Path]:
-    all_files = list(root.rglob("*.pdf")) + list(root.rglob("*.docx"))
     buckets = {}
-    for f in all_files:
+    for entry in iter_resume_files(root, (".pdf", ".docx")):
+        f = Path(entry.path)
         key = (f.parent, f.stem)
         buckets.setdefault(key, {})
         buckets[key][f.suffix.lower()] = f
@@ -75,8 +96,76 @@ def find_resume_files(root: Path) -> List[Path]:
             chosen.append(variants.get(".pdf"))
     return [c for c in chosen if c is not None]
 
+# Text extraction backends are imported inside the readers: they run in worker
+# processes, and importing MuPDF in the parent before forking is not fork-safe.
+
+# WordprocessingML tags for the DOCX body walk, in lxml's Clark notation (what docx.oxml.ns.qn returns)
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P, _W_TBL, _W_TR, _W_TC, _W_R, _W_T, _W_TXBX = (_W + t for t in ("p", "tbl", "tr", "tc", "r", "t", "txbxContent"))
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+# Run content rendered like Paragraph.text; only direct children of w:r, so drawings,
+# text boxes and mc:AlternateContent inside a run never leak into the paragraph's text
+_DOCX_RUN_TEXT = {_W_T: "", _W + "tab": "\t", _W + "br": "\n", _W + "cr": "\n", _W + "noBreakHyphen": "-"}
+# Inline wrappers whose runs still belong to the paragraph (incl. tracked insertions)
+_DOCX_RUN_CONTAINERS = {_W + t for t in ("hyperlink", "ins", "smartTag", "fldSimple", "customXml", "sdt", "sdtContent")}
+
+def _docx_runs_text(el, out: List[str]) -> None:
+    for child in el.iterchildren():
+        if child.tag == _W_R:
+            for n in child.iterchildren(*_DOCX_RUN_TEXT):
+                out.append((n.text or "") if n.tag == _W_T else _DOCX_RUN_TEXT[n.tag])
+        elif child.tag in _DOCX_RUN_CONTAINERS:
+            _docx_runs_text(child, out)
+
+def _docx_owning_textbox(el, stop):
+    # Nearest w:txbxContent / mc:Fallback ancestor of el below stop, if any
+    el = el.getparent()
+    while el is not None and el is not stop:
+        if el.tag in (_W_TXBX, _MC_FALLBACK):
+            return el
+        el = el.getparent()
+    return None
+
+def _docx_para_lines(p) -> List[str]:
+    out: List[str] = []
+    _docx_runs_text(p, out)
+    lines = ["".join(out)]
+    # Text-box paragraphs follow their anchor paragraph as separate lines; the mc:Fallback
+    # copy of each text box is skipped so its content appears once
+    for tx in p.iter(_W_TXBX):
+        if _docx_owning_textbox(tx, p) is None:
+            for tp in tx.iterchildren(_W_P):
+                lines.extend(_docx_para_lines(tp))
+    return lines
+
+def _docx_row_text(tr) -> str:
+    # One entry per w:tc, unlike row.cells: a horizontally merged (gridSpan) cell is emitted
+    # once instead of once per grid column it spans, and a vMerge continuation cell is empty
+    # instead of repeating the text of the cell it continues
+    cells = ["\n".join(line for p in tc.iterchildren(_W_P) for line in _docx_para_lines(p))
+             for tc in tr.iterchildren(_W_TC)]
+    return " | ".join(cells)
+
 def read_docx_text(path: Path) -> str:
+    from docx import Document
     doc = Document(path)
+    # Walk the body XML directly instead of building Paragraph/Table/Cell wrappers;
+    # this also keeps tables in document order rather than appending them at the end.
+    parts = []
+    for block in doc.element.body.iterchildren():
+        if block.tag == _W_P:
+            parts.extend(_docx_para_lines(block))
+        elif block.tag == _W_TBL:
+            parts.extend(_docx_row_text(tr) for tr in block.iterchildren(_W_TR))
+        else:
+            # content controls etc. wrap ordinary paragraphs
+            for p in block.iter(_W_P):
+                if _docx_owning_textbox(p, block) is None:
+                    parts.extend(_docx_para_lines(p))
+    text = "\n".join([p for p in parts if p and p.strip()])
+    if text:
+        return text
+    # Fall back to the high-level API for layouts the walk above does not cover
     parts = [p.text for p in doc.paragraphs]
     for table in doc.tables:
         for row in table.rows:
@@ -85,92 +174,176 @@ def read_docx_text(path: Path) -> str:
     return "\n".join([p for p in parts if p and p.strip()])
 
 def read_pdf_text(path: Path) -> str:
-    text_chunks = []
+    import fitz  # PyMuPDF (default)
+    # PyMuPDF's default "text" flags plus joining words hyphenated across line breaks
+    flags = fitz.TEXTFLAGS_TEXT | fitz.TEXT_DEHYPHENATE
+    # Normalize each page as it is read instead of regex-passing the whole document
+    buf = io.StringIO()
     with fitz.open(path) as doc:
-        for page in doc:
-            text_chunks.append(page.get_text(\"text\"))
-    raw = \"\n\".join(text_chunks)
-    raw = re.sub(r\"[ \\t]+\", \" \", raw)
-    raw = re.sub(r\"\\n{3,}\", \"\\n\\n\", raw)
-    return raw.strip()
+        for i, page in enumerate(doc):
+            if i:
+                buf.write("\n")
+            buf.write(_HSPACE_RE.sub(" ", page.get_text("text", flags=flags)))
+    return _BLANK_LINES_RE.sub("\n\n", buf.getvalue()).strip()
 
 def extract_text(path: Path) -> str:
-    if path.suffix.lower() == \".docx\":
+    if path.suffix.lower() == ".docx":
         return read_docx_text(path)
-    elif path.suffix.lower() == \".pdf\":
+    elif path.suffix.lower() == ".pdf":
         return read_pdf_text(path)
     else:
-        raise ValueError(f\"Unsupported file type: {path.suffix}\")
+        raise ValueError(f"Unsupported file type: {path.suffix}")
 
 # -----------------------------
 # LLM callers
 # -----------------------------
 
-def safe_json_loads(s: str) -> Dict[str, Any]:
-    try:
-        return json.loads(s)
-    except json.JSONDecodeError:
-        last_brace = s.rfind(\"}\")
-        if last_brace != -1:
-            s2 = s[:last_brace+1]
-            return json.loads(s2)
-        raise
-
-def call_ollama(resume_text: str, model: str = \"llama3.2\", host: Optional[str] = None) -> Dict[str, Any]:
-    base = host or os.environ.get(\"OLLAMA_HOST\", \"http://localhost:11434\")
-    url = f\"{base}/api/chat\"
+# Shared keep-alive session; the pool is sized for the concurrent LLM workers
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=16, pool_maxsize=max(16, MAX_WORKERS)))
+_SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=max(16, MAX_WORKERS)))
+
+def _ollama_base(host: Optional[str] = None) -> str:
+    return host or os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+
+def warm_ollama(model: str = MODEL, host: Optional[str] = None, keep_alive: str = OLLAMA_KEEP_ALIVE,
+                num_ctx: Optional[int] = None) -> None:
+    # A generate request without a prompt just loads the model and keeps it resident;
+    # it must use the same num_ctx as the real requests or the first of them reloads the model
+    payload = {"model": model, "keep_alive": keep_alive, "options": {"num_ctx": num_ctx or OLLAMA_MAX_CTX}}
+    r = _SESSION.post(f"{_ollama_base(host)}/api/generate", json=payload, timeout=300)
+    r.raise_for_status()
+
+MIN_RESUME_CHARS = 2000  # below this a context setting is treated as misconfigured, not truncated to
+
+def ollama_text_budget(num_ctx: int, num_predict: Optional[int]) -> int:
+    # Chars of resume text (~4 chars/token) that fit num_ctx after the prompts, the full
+    # num_predict output and 512 tokens of slack for the chat template
+    overhead_chars = len(EXTRACTION_SYSTEM_PROMPT) + len(EXTRACTION_USER_PROMPT_TEMPLATE) + len(SCHEMA_PROMPT)
+    return (num_ctx - (num_predict or 0) - 512) * 4 - overhead_chars
+
+def call_ollama(resume_text: str, model: str = MODEL, host: Optional[str] = None,
+                num_ctx: Optional[int] = None, num_batch: Optional[int] = None,
+                num_predict: Optional[int] = OLLAMA_NUM_PREDICT, keep_alive: str = OLLAMA_KEEP_ALIVE) -> Dict[str, Any]:
+    base = _ollama_base(host)
+    url = f"{base}/api/chat"
+    # Every request uses the same context size (OLLAMA_NUM_CTX, else OLLAMA_MAX_CTX): Ollama reloads
+    # the model runner whenever num_ctx changes, which would serialize concurrent requests.
+    # Only truncate when the text cannot fit that context.
+    num_ctx = num_ctx or OLLAMA_MAX_CTX
+    max_chars = ollama_text_budget(num_ctx, num_predict)
+    if max_chars < MIN_RESUME_CHARS:
+        raise ValueError(f"Context of {num_ctx} tokens leaves room for only {max(0, max_chars)} chars of resume text "
+                         f"after {num_predict} output tokens; raise OLLAMA_NUM_CTX/OLLAMA_MAX_CTX or lower OLLAMA_NUM_PREDICT")
+    if len(resume_text) > max_chars:
+        print(f"[!] Resume text truncated from {len(resume_text)} to {max_chars} chars to fit a {num_ctx}-token context "
+              f"(raise OLLAMA_MAX_CTX/OLLAMA_NUM_CTX to keep more)")
+        resume_text = resume_text[:max_chars]
     payload = {
-        \"model\": model,
-        \"messages\": [
-            {\"role\": \"system\", \"content\": EXTRACTION_SYSTEM_PROMPT},
-            {\"role\": \"user\", \"content\": EXTRACTION_USER_PROMPT_TEMPLATE.format(
-                schema=json.dumps(JSON_SCHEMA_EXAMPLE, indent=2),
-                resume_text=resume_text[:120000]
+        "model": model,
+        "messages": [
+            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+            {"role": "user", "content": EXTRACTION_USER_PROMPT_TEMPLATE.format(
+                schema=SCHEMA_PROMPT,
+                resume_text=resume_text
             )}
         ],
-        \"format\": \"json\",
-        \"stream\": False
+        "format": RESUME_SCHEMA,
+        "stream": False,
+        "keep_alive": keep_alive,
+        "options": {"temperature": 0}
     }
-    r = requests.post(url, json=payload, timeout=300)
+    for k, v in (("num_ctx", num_ctx), ("num_batch", num_batch), ("num_predict", num_predict)):
+        if v:
+            payload["options"][k] = v
+    r = _SESSION.post(url, json=payload, timeout=300)
     r.raise_for_status()
     data = r.json()
-    content = data.get(\"message\", {}).get(\"content\", \"\").strip()
-    return safe_json_loads(content)
+    content = data.get("message", {}).get("content", "").strip()
+    return json_loads(content)
 
-def call_openai(resume_text: str, model: str = \"gpt-4o-mini\") -> Dict[str, Any]:
-    api_key = OPENAI_API_KEY or os.environ.get(\"OPENAI_API_KEY\")
+def call_openai(resume_text: str, model: str = "gpt-4o-mini") -> Dict[str, Any]:
+    api_key = OPENAI_API_KEY or os.environ.get("OPENAI_API_KEY")
     if not api_key:
-        raise RuntimeError(\"OPENAI_API_KEY not set (env or config)\" )
-    url = \"https://api.openai.com/v1/chat/completions\"
-    headers = {\"Authorization\": f\"Bearer {api_key}\", \"Content-Type\": \"application/json\"}
+        raise RuntimeError("OPENAI_API_KEY not set (env or config)" )
+    url = "https://api.openai.com/v1/chat/completions"
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     payload = {
-        \"model\": model,
-        \"temperature\": 0,
-        \"response_format\": {\"type\": \"json_object\"},
-        \"messages\": [
-            {\"role\": \"system\", \"content\": EXTRACTION_SYSTEM_PROMPT},
-            {\"role\": \"user\", \"content\": EXTRACTION_USER_PROMPT_TEMPLATE.format(
-                schema=json.dumps(JSON_SCHEMA_EXAMPLE, indent=2),
+        "model": model,
+        "temperature": 0,
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "resume", "schema": RESUME_SCHEMA, "strict": True}
+        },
+        "messages": [
+            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+            {"role": "user", "content": EXTRACTION_USER_PROMPT_TEMPLATE.format(
+                schema=SCHEMA_PROMPT,
                 resume_text=resume_text[:120000]
             )}
         ]
     }
-    r = requests.post(url, headers=headers, json=payload, timeout=300)
+    r = _SESSION.post(url, headers=headers, json=payload, timeout=300)
     r.raise_for_status()
     data = r.json()
-    content = data[\"choices\"][0][\"message\"][\"content\"].strip()
-    return safe_json_loads(content)
+    content = data["choices"][0]["message"]["content"].strip()
+    return json_loads(content)
 
-def extract_one_resume_to_json(path: Path, provider: str, model: str, ollama_host: Optional[str] = None) -> Dict[str, Any]:
-    text = extract_text(path)
-    if not text.strip():
-        raise RuntimeError(f\"No text extracted from {path}\")
-    if provider == \"ollama\":
-        return call_ollama(text, model=model, host=ollama_host)
-    elif provider == \"openai\":
+def text_to_json(text: str, provider: str, model: str, ollama_host: Optional[str] = None,
+                 num_ctx: Optional[int] = None, num_batch: Optional[int] = None) -> Dict[str, Any]:
+    if provider == "ollama":
+        return call_ollama(text, model=model, host=ollama_host, num_ctx=num_ctx, num_batch=num_batch)
+    elif provider == "openai":
         return call_openai(text, model=model)
     else:
-        raise ValueError(\"provider must be 'ollama' or 'openai'\")
+        raise ValueError("provider must be 'ollama' or 'openai'")
+
+def extract_one_resume_to_json(path: Path, provider: str, model: str, ollama_host: Optional[str] = None,
+                               num_ctx: Optional[int] = None, num_batch: Optional[int] = None) -> Dict[str, Any]:
+    text = extract_text(path)
+    if not text.strip():
+        raise RuntimeError(f"No text extracted from {path}")
+    return text_to_json(text, provider, model, ollama_host=ollama_host, num_ctx=num_ctx, num_batch=num_batch)
+
+# -----------------------------
+# Extraction cache
+# -----------------------------
+
+CACHE_DIRNAME = ".extract_cache"  # under OUTPUT_DIR; one <sha256>.json per cached LLM result
+# Prompt edits and context/output limits (which decide how much text the model sees) must invalidate earlier results
+_SETTINGS_DIGEST = hashlib.sha256("\0".join([
+    EXTRACTION_SYSTEM_PROMPT, EXTRACTION_USER_PROMPT_TEMPLATE, SCHEMA_PROMPT,
+    f"num_ctx={OLLAMA_NUM_CTX}", f"max_ctx={OLLAMA_MAX_CTX}", f"num_predict={OLLAMA_NUM_PREDICT}"
+]).encode("utf-8")).hexdigest()
+
+def cache_key(kind: str, digest: str, provider: str, model: str) -> str:
+    return hashlib.sha256(f"{kind}\0{digest}\0{provider}\0{model}\0{_SETTINGS_DIGEST}".encode("utf-8")).hexdigest()
+
+def file_cache_key(path: Path, provider: str, model: str) -> str:
+    # Keyed on the raw PDF/DOCX bytes, so a hit skips text extraction as well
+    with path.open("rb") as fh:
+        if hasattr(hashlib, "file_digest"):  # Python 3.11+
+            digest = hashlib.file_digest(fh, "sha256").hexdigest()
+        else:
+            digest = hashlib.sha256(fh.read()).hexdigest()
+    return cache_key("file", digest, provider, model)
+
+def text_cache_key(text: str, provider: str, model: str) -> str:
+    # Catches re-saved files whose bytes changed but whose text did not
+    return cache_key("text", hashlib.sha256(text.encode("utf-8")).hexdigest(), provider, model)
+
+def cache_get(cache_dir: Path, key: str) -> Optional[Dict[str, Any]]:
+    try:
+        data = read_json(cache_dir / f"{key}.json")
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+def cache_put(cache_dir: Path, key: str, data: Dict[str, Any]) -> None:
+    try:
+        write_json(cache_dir / f"{key}.json", data)
+    except Exception as e:
+        print(f"[!] Could not write cache entry {key}: {e}")
 
 # -----------------------------
 # Pipeline
@@ -183,32 +356,88 @@ def run_pipeline():
 
     files = find_resume_files(input_dir)
     if not files:
-        print(\"No resumes found.\")
+        print("No resumes found.")
         sys.exit(1)
 
-    extracted_jsons: List[Dict[str, Any]] = []
-    for f in files:
-        print(f\"[+] Processing: {f}\")
+    cache_dir = out_dir / CACHE_DIRNAME
+    cache_dir.mkdir(exist_ok=True)
+
+    results: Dict[int, Dict[str, Any]] = {}
+    def finish(i: int, f: Path, data: Dict[str, Any]) -> None:
+        per_file_out = out_dir / (f.stem + ".json")
+        write_json(per_file_out, data)
+        results[i] = data
+
+    # Unchanged source files are served from the cache without extraction or an LLM call
+    todo: List[Tuple[int, Path, str]] = []
+    for i, f in enumerate(files):
+        print(f"[+] Processing: {f}")
         try:
-            data = extract_one_resume_to_json(f, provider=PROVIDER, model=MODEL, ollama_host=OLLAMA_HOST)
-            per_file_out = out_dir / (f.stem + \".json\")
-            with per_file_out.open(\"w\", encoding=\"utf-8\") as fh:
-                json.dump(data, fh, ensure_ascii=False, indent=2)
-            extracted_jsons.append(data)
+            fkey = file_cache_key(f, PROVIDER, MODEL)
+            cached = cache_get(cache_dir, fkey)
+            if cached is not None:
+                print(f"[=] Cached: {f}")
+                finish(i, f, cached)
+            else:
+                todo.append((i, f, fkey))
         except Exception as e:
-            print(f\"[!] Failed on {f}: {e}\")
+            print(f"[!] Failed on {f}: {e}")
+
+    # One context size for the whole run, shared by the warm-up and every request
+    num_ctx = OLLAMA_NUM_CTX or OLLAMA_MAX_CTX
+    if todo and PROVIDER == "ollama":
+        # Load the model once up front so parallel requests don't all wait on it
+        try:
+            warm_ollama(MODEL, host=OLLAMA_HOST, num_ctx=num_ctx)
+        except Exception as e:
+            print(f"[!] Could not warm up Ollama model {MODEL}: {e}")
+
+    # Two-stage pipeline: CPU-bound text extraction in worker processes feeds
+    # network-bound LLM calls in threads; each JSON is written as it lands.
+    if todo:
+        with ProcessPoolExecutor() as pe, ThreadPoolExecutor(max_workers=MAX_WORKERS) as te:
+            pending = {}
+            for i, f, fkey in todo:
+                pending[pe.submit(extract_text, f)] = ("text", i, f, [fkey])
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    stage, i, f, keys = pending.pop(fut)
+                    try:
+                        if stage == "text":
+                            text = fut.result()
+                            if not text.strip():
+                                raise RuntimeError(f"No text extracted from {f}")
+                            tkey = text_cache_key(text, PROVIDER, MODEL)
+                            cached = cache_get(cache_dir, tkey)
+                            if cached is not None:
+                                print(f"[=] Cached: {f}")
+                                cache_put(cache_dir, keys[0], cached)
+                                finish(i, f, cached)
+                                continue
+                            llm_fut = te.submit(text_to_json, text, PROVIDER, MODEL, ollama_host=OLLAMA_HOST,
+                                                num_ctx=num_ctx, num_batch=OLLAMA_NUM_BATCH)
+                            pending[llm_fut] = ("llm", i, f, keys + [tkey])
+                        else:
+                            data = fut.result()
+                            for key in keys:
+                                cache_put(cache_dir, key, data)
+                            finish(i, f, data)
+                    except Exception as e:
+                        print(f"[!] Failed on {f}: {e}")
+    # Merge in discovery order so "first wins" tie-breaks stay deterministic
+    extracted_jsons: List[Dict[str, Any]] = [results[i] for i in sorted(results)]
 
     # Optional merge step
     if MERGE_AFTER_EXTRACTION:
         try:
             from merge_jsons import merge_all_resumes
             master = merge_all_resumes(extracted_jsons)
-            master_path = out_dir / \"master_resume.json\"
-            with master_path.open(\"w\", encoding=\"utf-8\") as fh:
-                json.dump(master, fh, ensure_ascii=False, indent=2)
-            print(f\"[✓] Master resume written to: {master_path}\")
+            master_path = out_dir / "master_resume.json"
+            write_json(master_path, master)
+            print(f"[✓] Master resume written to: {master_path}")
         except Exception as e:
-            print(f\"[!] Merge step failed. You can run 'python src/merge_jsons.py' later. Error: {e}\")
+            print(f"[!] Merge step failed. You can run 'python src/merge_jsons.py' later. Error: {e}")
 
-if __name__ == \"__main__\":
+if __name__ == "__main__":
     run_pipeline()
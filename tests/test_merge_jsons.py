@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import merge_jsons  # noqa: E402
+
+
+def test_cluster_names_does_not_join_via_token_subset():
+    pytest.importorskip("rapidfuzz")
+    canon = merge_jsons.cluster_names(["consulting", "ibm consulting", "accenture consulting",
+                                       "ohio state university", "state university", "penn state university",
+                                       "apple", "apple leisure group"])
+    assert canon["ibm consulting"] != canon["accenture consulting"]
+    assert canon["ohio state university"] != canon["penn state university"]
+    assert canon["apple"] != canon["apple leisure group"]
+
+
+def test_cluster_names_joins_near_identical_spellings():
+    pytest.importorskip("rapidfuzz")
+    canon = merge_jsons.cluster_names(["acme corp", "acme corp.", "beta llc"])
+    assert canon["acme corp."] == "acme corp"
+    assert canon["beta llc"] == "beta llc"
+
+
+def test_same_position_at_subset_named_employers_stays_separate():
+    resumes = [{"work": [
+        {"name": "IBM Consulting", "position": "Consultant", "startDate": "2015-01", "endDate": "2017-01"},
+        {"name": "Accenture Consulting", "position": "Consultant", "startDate": "2018-01", "endDate": "2020-01"},
+        {"name": "Consulting", "position": "Consultant", "startDate": "2021-01", "endDate": ""},
+    ]}]
+    work = merge_jsons.merge_all_resumes(resumes)["work"]
+    assert sorted(w["name"] for w in work) == ["Accenture Consulting", "Consulting", "IBM Consulting"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ([], ""),
+    (None, ""),
+    (5, "5"),
+    ("2020-13", "2020-01-01"),
+    ("2021-02-29", "2021-01-01"),
+    ("2020-02-29", "2020-02-29"),
+    ("2019/7", "2019-07-01"),
+])
+def test_parse_date_iso_coerces_and_validates(value, expected):
+    assert merge_jsons.parse_date_iso(value) == expected
+
+
+def test_unhashable_dates_do_not_crash_merge():
+    work = merge_jsons.merge_all_resumes([{"work": [{"name": "A", "position": "p", "startDate": []}]}])["work"]
+    assert work[0]["startDate"] == ""
+    merged = merge_jsons.merge_sections_list_of_objs([[{"title": "x", "date": []}]], ["title"])
+    assert merged == [{"title": "x", "date": ""}]
@@ -0,0 +1,168 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+pytest.importorskip("requests")
+import resume_extractor  # noqa: E402
+
+
+class _FakeResponse:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"message": {"content": "{}"}}
+
+
+@pytest.fixture
+def ollama_payloads(monkeypatch):
+    payloads = []
+
+    def post(url, json=None, timeout=None):
+        payloads.append(json)
+        return _FakeResponse()
+
+    monkeypatch.setattr(resume_extractor._SESSION, "post", post)
+    return payloads
+
+
+@pytest.mark.parametrize("num_ctx", [None, 8192])
+def test_resumes_of_different_lengths_share_num_ctx(ollama_payloads, num_ctx):
+    resume_extractor.warm_ollama(num_ctx=num_ctx)
+    resume_extractor.call_ollama("short resume", num_ctx=num_ctx)
+    resume_extractor.call_ollama("long resume " * 2000, num_ctx=num_ctx)
+    assert len({p["options"]["num_ctx"] for p in ollama_payloads}) == 1
+
+
+def test_text_budget_reserves_full_num_predict():
+    budget = resume_extractor.ollama_text_budget
+    overhead = -budget(512, 0)  # prompts only: the context is exactly the 512-token slack
+    assert budget(8192, 2048) == (8192 - 2048 - 512) * 4 - overhead
+    assert budget(8192, 1024) - budget(8192, 2048) == 1024 * 4
+    assert budget(8192, None) == budget(8192, 0)
+
+
+def test_num_predict_that_leaves_no_room_for_text_raises(ollama_payloads):
+    with pytest.raises(ValueError, match="OLLAMA_NUM_PREDICT"):
+        resume_extractor.call_ollama("resume", num_ctx=2048, num_predict=2048)
+    assert ollama_payloads == []
+
+
+def test_long_text_is_truncated_to_budget_and_num_predict_sent_unchanged(ollama_payloads):
+    limit = resume_extractor.ollama_text_budget(8192, 2048)
+    resume_extractor.call_ollama("x" * (limit + 500), num_ctx=8192, num_predict=2048)
+    options = ollama_payloads[0]["options"]
+    assert options["num_predict"] == 2048
+    assert "x" * limit in ollama_payloads[0]["messages"][1]["content"]
+    assert "x" * (limit + 1) not in ollama_payloads[0]["messages"][1]["content"]
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    # run_pipeline over tmp_path with in-thread extraction and a fake LLM; each run returns the calls it made
+    input_dir, out_dir = tmp_path / "in", tmp_path / "out"
+    input_dir.mkdir()
+    calls = {"extract": [], "llm": []}
+
+    def extract_text(path):
+        calls["extract"].append(path.name)
+        return path.read_text(encoding="utf-8").strip()
+
+    def text_to_json(text, provider, model, **kwargs):
+        calls["llm"].append(text)
+        return {"basics": {"name": text}}
+
+    for name, value in (("INPUT_DIR", str(input_dir)), ("OUTPUT_DIR", str(out_dir)), ("PROVIDER", "ollama"),
+                        ("MERGE_AFTER_EXTRACTION", False), ("ProcessPoolExecutor", resume_extractor.ThreadPoolExecutor),
+                        ("extract_text", extract_text), ("text_to_json", text_to_json),
+                        ("warm_ollama", lambda *args, **kwargs: None)):
+        monkeypatch.setattr(resume_extractor, name, value)
+
+    def run():
+        for v in calls.values():
+            v.clear()
+        resume_extractor.run_pipeline()
+        return calls
+
+    run.input_dir, run.out_dir = input_dir, out_dir
+    return run
+
+
+def test_file_key_hit_skips_extraction(pipeline):
+    (pipeline.input_dir / "a.docx").write_text("Alice", encoding="utf-8")
+    assert pipeline() == {"extract": ["a.docx"], "llm": ["Alice"]}
+    (pipeline.out_dir / "a.json").unlink()
+    assert pipeline() == {"extract": [], "llm": []}
+    assert resume_extractor.read_json(pipeline.out_dir / "a.json") == {"basics": {"name": "Alice"}}
+
+
+def test_text_key_hit_backfills_file_key(pipeline):
+    src = pipeline.input_dir / "a.docx"
+    src.write_text("Alice", encoding="utf-8")
+    pipeline()
+    src.write_text("Alice\n", encoding="utf-8")  # new bytes, same extracted text
+    assert pipeline() == {"extract": ["a.docx"], "llm": []}
+    assert pipeline() == {"extract": [], "llm": []}
+
+
+def test_failed_write_on_cache_hit_is_reported_per_file(pipeline, capsys):
+    (pipeline.input_dir / "a.docx").write_text("Alice", encoding="utf-8")
+    (pipeline.input_dir / "b.docx").write_text("Bob", encoding="utf-8")
+    pipeline()
+    (pipeline.out_dir / "a.json").unlink()
+    (pipeline.out_dir / "a.json").mkdir()  # writing a.json now fails
+    (pipeline.out_dir / "b.json").unlink()
+    capsys.readouterr()
+    assert pipeline() == {"extract": [], "llm": []}
+    out = capsys.readouterr().out
+    assert f"[!] Failed on {pipeline.input_dir / 'a.docx'}" in out
+    assert resume_extractor.read_json(pipeline.out_dir / "b.json") == {"basics": {"name": "Bob"}}
+
+
+@pytest.mark.parametrize("setting, value", [("_SETTINGS_DIGEST", "changed"), ("MODEL", "other-model")])
+def test_changed_settings_miss_the_cache(pipeline, monkeypatch, setting, value):
+    (pipeline.input_dir / "a.docx").write_text("Alice", encoding="utf-8")
+    pipeline()
+    monkeypatch.setattr(resume_extractor, setting, value)
+    assert pipeline() == {"extract": ["a.docx"], "llm": ["Alice"]}
+
+
+_TEXTBOX_PARAGRAPH = """<w:p xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006"
+    xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" xmlns:v="urn:schemas-microsoft-com:vml">
+  <w:r><w:t>Anchor</w:t></w:r>
+  <w:r><mc:AlternateContent>
+    <mc:Choice Requires="wps"><w:drawing><wps:txbx>{box}</wps:txbx></w:drawing></mc:Choice>
+    <mc:Fallback><w:pict><v:textbox>{box}</v:textbox></w:pict></mc:Fallback>
+  </mc:AlternateContent></w:r>
+  <w:hyperlink><w:r><w:t xml:space="preserve"> link</w:t></w:r></w:hyperlink>
+</w:p>""".format(box="<w:txbxContent><w:p><w:r><w:t>Skills: Python</w:t></w:r></w:p></w:txbxContent>")
+
+
+def test_docx_text_box_appears_once(tmp_path):
+    docx = pytest.importorskip("docx")
+    from docx.oxml import parse_xml
+    doc = docx.Document()
+    doc.add_paragraph("Before")
+    doc.element.body.insert(1, parse_xml(_TEXTBOX_PARAGRAPH))
+    doc.save(tmp_path / "tb.docx")
+    assert resume_extractor.read_docx_text(tmp_path / "tb.docx") == "Before\nAnchor link\nSkills: Python"
+
+
+def test_docx_tables_keep_document_order_and_merged_cells_appear_once(tmp_path):
+    docx = pytest.importorskip("docx")
+    doc = docx.Document()
+    doc.add_paragraph("Before")
+    table = doc.add_table(rows=3, cols=3)
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "Span"  # gridSpan
+    table.cell(0, 2).text = "C"
+    table.cell(1, 0).merge(table.cell(2, 0)).text = "Tall"  # vMerge
+    for i in (1, 2):
+        table.cell(i, 1).text, table.cell(i, 2).text = f"b{i}", f"c{i}"
+    doc.add_paragraph("After")
+    doc.save(tmp_path / "t.docx")
+    assert resume_extractor.read_docx_text(tmp_path / "t.docx").splitlines() == [
+        "Before", "Span | C", "Tall | b1 | c1", " | b2 | c2", "After"]